@@ -0,0 +1,169 @@
+from datetime import datetime
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.sql import func
+from . import models, schemas
+from .timer_service import TimerService, create_lights_off_callback, create_water_pump_off_callback
+
+
+async def get_or_create_sensor_data(db: AsyncSession):
+    """
+    Get existing sensor data or create a new record if none exists
+    """
+    result = await db.execute(select(models.SensorData).limit(1))
+    sensor_data = result.scalars().first()
+    if not sensor_data:
+        sensor_data = models.SensorData()
+        db.add(sensor_data)
+        await db.commit()
+        await db.refresh(sensor_data)
+    return sensor_data
+
+async def _apply_sensor_update(db: AsyncSession, sensor_data_update: schemas.SensorDataCreate):
+    """
+    Update sensor data with appropriate timestamps and record a reading when a sensor value changed
+    """
+    sensor_data = await get_or_create_sensor_data(db)
+
+    update_data = sensor_data_update.dict(exclude_unset=True)
+
+    for key, value in update_data.items():
+        setattr(sensor_data, key, value)
+
+        if key == 'temperature':
+            sensor_data.temperature_timestamp = func.now()
+        elif key == 'humidity':
+            sensor_data.humidity_timestamp = func.now()
+        elif key == 'luminosity':
+            sensor_data.luminosity_timestamp = func.now()
+        elif key == 'lights_status':
+            sensor_data.lights_status_timestamp = func.now()
+        elif key == 'water_pump_status':
+            sensor_data.water_pump_status_timestamp = func.now()
+
+    reading = None
+    if update_data.keys() & {'temperature', 'humidity', 'luminosity'}:
+        reading = models.SensorReading(
+            temperature=sensor_data.temperature,
+            humidity=sensor_data.humidity,
+            luminosity=sensor_data.luminosity
+        )
+        db.add(reading)
+
+    await db.commit()
+    await db.refresh(sensor_data)
+    if reading is not None:
+        await db.refresh(reading)
+    return sensor_data, reading
+
+async def update_sensor_data(db: AsyncSession, sensor_data_update: schemas.SensorDataCreate):
+    """
+    Update sensor data with appropriate timestamps
+    """
+    sensor_data, _ = await _apply_sensor_update(db, sensor_data_update)
+    return sensor_data
+
+async def create_sensor_reading(db: AsyncSession, reading: schemas.SensorReadingCreate):
+    """
+    Record a reading of one or more sensors, leaving the devices untouched
+    """
+    _, db_reading = await _apply_sensor_update(db, schemas.SensorDataCreate(**reading.dict(exclude_none=True)))
+    return db_reading
+
+async def get_sensor_readings(db: AsyncSession, start: datetime = None, end: datetime = None, skip: int = 0, limit: int = 100):
+    """
+    Get recorded readings, newest first
+    """
+    query = select(models.SensorReading)
+    if start:
+        query = query.filter(models.SensorReading.recorded_at >= start)
+    if end:
+        query = query.filter(models.SensorReading.recorded_at <= end)
+    query = query.order_by(models.SensorReading.recorded_at.desc(), models.SensorReading.id.desc())
+    result = await db.execute(query.offset(skip).limit(limit))
+    return result.scalars().all()
+
+
+async def control_lights_with_timer(db: AsyncSession, duration_minutes: int = None, db_factory = None):
+    """
+    Control lights with timer
+
+    The timer callback runs on the timer thread, so db_factory must return a sync Session
+    """
+    sensor_data = await get_or_create_sensor_data(db)
+    sensor_data.lights_status = True
+    await db.commit()
+    await db.refresh(sensor_data)
+
+    timer_service = TimerService()
+
+    if duration_minutes and duration_minutes > 0:
+        lights_off_callback = create_lights_off_callback(db_factory)
+        timer_service.start_timer("lights", duration_minutes, lights_off_callback, target_state="off")
+
+    return sensor_data
+
+async def control_water_pump_with_timer(db: AsyncSession, duration_minutes: int = None, db_factory = None):
+    """
+    Control water pump with timer
+
+    The timer callback runs on the timer thread, so db_factory must return a sync Session
+    """
+    sensor_data = await get_or_create_sensor_data(db)
+    sensor_data.water_pump_status = True
+    await db.commit()
+    await db.refresh(sensor_data)
+
+    timer_service = TimerService()
+
+    if duration_minutes and duration_minutes > 0:
+        water_pump_off_callback = create_water_pump_off_callback(db_factory)
+        timer_service.start_timer("water_pump", duration_minutes, water_pump_off_callback, target_state="off")
+
+    return sensor_data
+
+async def create_rule(db: AsyncSession, rule: schemas.RuleCreate):
+    """Create a new rule"""
+    db_rule = models.Rule(**rule.dict())
+    db.add(db_rule)
+    await db.commit()
+    await db.refresh(db_rule)
+    return db_rule
+
+async def get_rules(db: AsyncSession, skip: int = 0, limit: int = 100):
+    """Get all rules"""
+    result = await db.execute(select(models.Rule).offset(skip).limit(limit))
+    return result.scalars().all()
+
+async def get_rule(db: AsyncSession, rule_id: int):
+    """Get a specific rule by ID"""
+    result = await db.execute(select(models.Rule).filter(models.Rule.id == rule_id))
+    return result.scalars().first()
+
+async def get_active_rules_by_device(db: AsyncSession, device_type: str):
+    """Get all active rules for a specific device type"""
+    result = await db.execute(select(models.Rule).filter(
+        models.Rule.device_type == device_type,
+        models.Rule.is_active == True
+    ))
+    return result.scalars().all()
+
+async def update_rule(db: AsyncSession, rule_id: int, rule_update: schemas.RuleUpdate):
+    """Update an existing rule"""
+    db_rule = await get_rule(db, rule_id)
+    if db_rule:
+        update_data = rule_update.dict(exclude_unset=True)
+        for key, value in update_data.items():
+            setattr(db_rule, key, value)
+        await db.commit()
+        await db.refresh(db_rule)
+    return db_rule
+
+async def delete_rule(db: AsyncSession, rule_id: int):
+    """Delete a rule"""
+    db_rule = await get_rule(db, rule_id)
+    if db_rule:
+        await db.delete(db_rule)
+        await db.commit()
+        return True
+    return False
@@ -0,0 +1,188 @@
+# backtest.py
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Tuple
+import threading
+import numpy as np
+from sqlalchemy.orm import Session
+
+SENSORS = ("temperature", "humidity", "luminosity")
+
+# Two years of one-minute checks
+MAX_EVALUATIONS = 2 * 366 * 24 * 60
+
+
+def to_naive_utc(value: datetime) -> datetime:
+    """Readings are stored as naive UTC timestamps"""
+    if value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def _check_interval_minutes(rule) -> int:
+    # The checker loop wakes up once a minute, so shorter intervals behave like one minute
+    return max(rule.check_interval_minutes or 0, 1)
+
+
+def evaluation_count(rule, start: datetime, end: datetime) -> int:
+    """Number of checks a backtest between start and end would run"""
+    elapsed = to_naive_utc(end) - to_naive_utc(start)
+    return elapsed // timedelta(minutes=_check_interval_minutes(rule)) + 1
+
+
+class ReadingsCache:
+    """
+    Columnar copy of sensor_readings kept in memory
+
+    Readings are only ever appended, so each refresh loads just the rows added
+    since the previous one. Loading a year of rows through sqlite3 takes about a
+    second, so start() warms the cache in the background when the app starts.
+    """
+    _instance = None
+    _lock = threading.Lock()
+
+    def __new__(cls):
+        with cls._lock:
+            if cls._instance is None:
+                cls._instance = super(ReadingsCache, cls).__new__(cls)
+                cls._instance.refresh_lock = threading.Lock()
+                cls._instance._reset()
+            return cls._instance
+
+    def _reset(self):
+        self.last_id = 0
+        self.recorded_at = np.empty(0, dtype="datetime64[s]")
+        self.values = np.empty((0, len(SENSORS)), dtype=np.float64)
+
+    def start(self, db_factory):
+        """Load the existing readings in a background thread"""
+        threading.Thread(target=self._warm, args=(db_factory,), daemon=True).start()
+
+    def _warm(self, db_factory):
+        db = db_factory()
+        try:
+            self.refresh(db)
+            print(f"Readings cache loaded {len(self.recorded_at)} readings")
+        except Exception as e:
+            print(f"Error loading readings cache: {e}")
+        finally:
+            db.close()
+
+    def refresh(self, db: Session) -> Tuple[np.ndarray, np.ndarray]:
+        """Append readings recorded since the last refresh and return (recorded_at, values)"""
+        from . import crud
+
+        with self.refresh_lock:
+            if crud.get_latest_reading_id(db) < self.last_id:
+                # The table was recreated underneath us
+                self._reset()
+
+            rows = crud.get_readings_after(db, self.last_id)
+            if rows:
+                data = np.array(rows, dtype=np.float64)
+                new_times = data[:, 1].astype(np.int64).astype("datetime64[s]")
+                recorded_at = np.concatenate([self.recorded_at, new_times])
+                values = np.concatenate([self.values, data[:, 2:]])
+
+                # Ids follow insertion order, which only disagrees with time if the clock went back
+                if np.any(np.diff(recorded_at[max(len(self.recorded_at) - 1, 0):]) < np.timedelta64(0, "s")):
+                    order = np.argsort(recorded_at, kind="stable")
+                    recorded_at, values = recorded_at[order], values[order]
+
+                self.recorded_at, self.values = recorded_at, values
+                self.last_id = int(data[-1, 0])
+
+            return self.recorded_at, self.values
+
+    def window(self, db: Session, start: datetime, end: datetime) -> Tuple[np.ndarray, np.ndarray]:
+        """Readings between start and end, plus the last one before start so the first check has data"""
+        recorded_at, values = self.refresh(db)
+        lo = max(np.searchsorted(recorded_at, np.datetime64(start, "us"), side="right") - 1, 0)
+        hi = np.searchsorted(recorded_at, np.datetime64(end, "us"), side="right")
+        return recorded_at[lo:hi], values[lo:hi]
+
+
+def backtest_rule(db: Session, rule, start: datetime, end: datetime) -> Dict:
+    """
+    Replay recorded readings between start and end through a rule
+
+    Mirrors RuleChecker: the rule is checked at start and then every
+    check_interval_minutes against the latest reading at that time.
+    Callers should keep evaluation_count within MAX_EVALUATIONS.
+    """
+    start = to_naive_utc(start)
+    end = to_naive_utc(end)
+    recorded_at, values = ReadingsCache().window(db, start, end)
+
+    columns = dict(zip(SENSORS, values.T))
+    return evaluate_rule(rule, recorded_at, columns, np.datetime64(start, "us"), np.datetime64(end, "us"))
+
+
+def _conditions_met(rule, recorded_at: np.ndarray, columns: Dict[str, np.ndarray],
+                    check_times: np.ndarray) -> np.ndarray:
+    """Evaluate the rule conditions at each check time against the latest reading"""
+    if not len(recorded_at):
+        return np.zeros(len(check_times), dtype=bool)
+
+    # Index of the latest reading at or before each check, -1 when there is none yet
+    idx = np.searchsorted(recorded_at, check_times, side="right") - 1
+    conditions_met = idx >= 0
+    idx = np.maximum(idx, 0)
+
+    for name in SENSORS:
+        condition = getattr(rule, f"{name}_condition")
+        value = getattr(rule, f"{name}_value")
+        if not condition or value is None:
+            continue
+
+        values = columns[name][idx]
+        if condition == ">":
+            conditions_met &= values > value
+        elif condition == "<":
+            conditions_met &= values < value
+
+    return conditions_met
+
+
+def _device_on_minutes(triggers: np.ndarray, duration: np.timedelta64, end: np.datetime64) -> float:
+    """
+    Minutes the device is on, following the timer semantics
+
+    Every trigger turns the device on and starts its own timer, and any timer
+    that expires turns the device off. Re-triggering therefore does not extend
+    the on period: the earliest pending timer still ends it. Without a positive
+    duration no timer is started and the device stays on.
+    """
+    if not len(triggers):
+        return 0.0
+
+    if duration <= np.timedelta64(0, "m"):
+        on_time = end - triggers[0]
+        return float(on_time.astype("timedelta64[us]").astype(np.int64)) / 60e6
+
+    times = np.concatenate([triggers, triggers + duration])
+    turns_on = np.concatenate([np.ones(len(triggers), dtype=bool), np.zeros(len(triggers), dtype=bool)])
+    # At equal times the trigger runs first; the timer thread only notices expiry on its next tick
+    order = np.lexsort((~turns_on, times))
+    times = np.minimum(times[order], end)
+    turns_on = turns_on[order]
+
+    # The device state after each event holds until the next one
+    on_time = np.diff(times)[turns_on[:-1]]
+    return float(on_time.astype("timedelta64[us]").astype(np.int64).sum()) / 60e6
+
+
+def evaluate_rule(rule, recorded_at: np.ndarray, columns: Dict[str, np.ndarray],
+                  start: np.datetime64, end: np.datetime64) -> Dict:
+    """Vectorized rule evaluation over sorted columnar readings"""
+    interval = np.timedelta64(_check_interval_minutes(rule), "m")
+    check_times = np.arange(start, end + np.timedelta64(1, "us"), interval)
+
+    triggers = check_times[_conditions_met(rule, recorded_at, columns, check_times)]
+    duration = np.timedelta64(rule.duration_minutes or 0, "m")
+
+    return {
+        "evaluations": int(len(check_times)),
+        "trigger_count": int(len(triggers)),
+        "trigger_times": triggers.astype("datetime64[us]").tolist(),
+        "device_on_minutes": _device_on_minutes(triggers, duration, end)
+    }
@@ -1,7 +1,9 @@
+from datetime import datetime
 from sqlalchemy.orm import Session
 from sqlalchemy.sql import func
 from . import models, schemas
 from .timer_service import TimerService, create_lights_off_callback, create_water_pump_off_callback
+from .worker_pool import DeviceWorkerPool
 
 
 def get_or_create_sensor_data(db: Session):
@@ -37,11 +39,41 @@ def update_sensor_data(db: Session, sensor_data_update: schemas.SensorDataCreate
             sensor_data.lights_status_timestamp = func.now()
         elif key == 'water_pump_status':
             sensor_data.water_pump_status_timestamp = func.now()
+
+    if update_data.keys() & {'temperature', 'humidity', 'luminosity'}:
+        db.add(models.SensorReading(
+            temperature=sensor_data.temperature,
+            humidity=sensor_data.humidity,
+            luminosity=sensor_data.luminosity
+        ))
    
     db.commit()
     db.refresh(sensor_data)
     return sensor_data
 
+READINGS_SQL = """
+    SELECT id, CAST(strftime('%s', recorded_at) AS INTEGER), temperature, humidity, luminosity
+    FROM sensor_readings
+    WHERE id > :last_id
+    ORDER BY id
+"""
+
+def get_latest_reading_id(db: Session) -> int:
+    """Get the id of the newest recorded reading, 0 when there is none"""
+    return db.query(func.max(models.SensorReading.id)).scalar() or 0
+
+def get_readings_after(db: Session, last_id: int):
+    """
+    Get readings recorded after last_id as (id, epoch seconds, temperature, humidity, luminosity) rows
+
+    Runs on the raw DBAPI cursor because building ORM rows dominates the cost for large ranges.
+    """
+    cursor = db.connection().connection.cursor()
+    try:
+        cursor.execute(READINGS_SQL, {"last_id": last_id})
+        return cursor.fetchall()
+    finally:
+        cursor.close()
 
 def control_lights_with_timer(db: Session, duration_minutes: int = None, db_factory = None):
     """
@@ -57,7 +89,7 @@ def control_lights_with_timer(db: Session, duration_minutes: int = None, db_fact
     
     if duration_minutes and duration_minutes > 0:
         lights_off_callback = create_lights_off_callback(db_factory)
-        timer_service.start_timer("lights", duration_minutes, lights_off_callback)
+        timer_service.start_timer("lights", duration_minutes, lights_off_callback, target_state="off")
     
     return sensor_data
 
@@ -76,7 +108,7 @@ def control_water_pump_with_timer(db: Session, duration_minutes: int = None, db_
     
     if duration_minutes and duration_minutes > 0:
         water_pump_off_callback = create_water_pump_off_callback(db_factory)
-        timer_service.start_timer("water_pump", duration_minutes, water_pump_off_callback)
+        timer_service.start_timer("water_pump", duration_minutes, water_pump_off_callback, target_state="off")
     
     return sensor_data
 
@@ -100,6 +132,12 @@ def get_timer_status():
         }
     }
 
+def get_worker_status():
+    """
+    Get the worker pool metrics
+    """
+    return DeviceWorkerPool().get_metrics()
+
 def create_rule(db: Session, rule: schemas.RuleCreate):
     """Create a new rule"""
     db_rule = models.Rule(**rule.dict())
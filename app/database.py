@@ -1,8 +1,11 @@
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 
 DATABASE_URL = "sqlite:///./iot_project.db"
+ASYNC_DATABASE_URL = "sqlite+aiosqlite:///./iot_project.db"
 
 engine = create_engine(
     DATABASE_URL, 
@@ -11,6 +14,22 @@ engine = create_engine(
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# aiosqlite runs every connection on its own thread, so keep a bounded set of them alive
+async_engine = create_async_engine(
+    ASYNC_DATABASE_URL,
+    poolclass=AsyncAdaptedQueuePool,
+    pool_size=10,
+    max_overflow=10
+)
+
+AsyncSessionLocal = sessionmaker(
+    autocommit=False,
+    autoflush=False,
+    expire_on_commit=False,
+    bind=async_engine,
+    class_=AsyncSession
+)
+
 Base = declarative_base()
 
 def get_db():
@@ -20,6 +39,10 @@ def get_db():
     finally:
         db.close()
 
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
 from . import models
 
 models.Base.metadata.create_all(bind=engine)
\ No newline at end of file
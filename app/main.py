@@ -1,9 +1,12 @@
 from fastapi import FastAPI
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
 from .routes import sensors, rules
 from .timer_service import TimerService
 from .rule_service import RuleChecker
-from .database import SessionLocal
+from .worker_pool import DeviceWorkerPool
+from .backtest import ReadingsCache
+from .database import SessionLocal, async_engine
 
 app = FastAPI(title="IoT Monitoring and Control API")
 app.add_middleware(
@@ -19,6 +22,8 @@ app.include_router(rules.router, prefix="/api", tags=["rules"])
 
 timer_service = TimerService()
 rule_checker = RuleChecker()
+worker_pool = DeviceWorkerPool()
+readings_cache = ReadingsCache()
 
 def get_db_session():
     db = SessionLocal()
@@ -31,11 +36,15 @@ def get_db_session():
 def startup_event():
     rule_checker.start(get_db_session)
     print("Rule checker service started")
+    readings_cache.start(get_db_session)
 
 @app.on_event("shutdown")
-def shutdown_event():
-    timer_service.stop()
-    rule_checker.stop()
+async def shutdown_event():
+    # The stops join threads and wait for queued DB commits, so keep them off the event loop
+    await run_in_threadpool(timer_service.stop)
+    await run_in_threadpool(rule_checker.stop)
+    await run_in_threadpool(worker_pool.stop)
+    await async_engine.dispose()
     print("All services stopped")
 
 @app.get("/")
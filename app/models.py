@@ -49,4 +49,17 @@ class Rule(Base):
     
     is_active = Column(Boolean, default=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
-    last_triggered = Column(DateTime(timezone=True), nullable=True)
\ No newline at end of file
+    last_triggered = Column(DateTime(timezone=True), nullable=True)
+
+class SensorReading(Base):
+    """
+    Model to store the history of sensor readings
+    """
+    __tablename__ = "sensor_readings"
+
+    id = Column(Integer, primary_key=True, index=True)
+    recorded_at = Column(DateTime(timezone=True), server_default=func.now(), index=True)
+
+    temperature = Column(Float, nullable=False, default=0.0)
+    humidity = Column(Float, nullable=False, default=0.0)
+    luminosity = Column(Float, nullable=False, default=0.0)
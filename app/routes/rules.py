@@ -1,27 +1,41 @@
 from fastapi import APIRouter, Depends, HTTPException, Query, Path
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from typing import List, Optional
 
-from ..database import get_db
-from .. import models, schemas, crud
+from ..database import get_db, get_async_db
+from .. import models, schemas, crud, async_crud, backtest
+from ..serialization import NegotiatedResponse, NegotiatedRoute, orm_to_dict
 
-router = APIRouter()
+router = APIRouter(route_class=NegotiatedRoute, default_response_class=NegotiatedResponse)
 
 @router.post("/rules", response_model=schemas.Rule)
-def create_rule(rule: schemas.RuleCreate, db: Session = Depends(get_db)):
+async def create_rule(rule: schemas.RuleCreate, db: AsyncSession = Depends(get_async_db)):
     """Create a new automation rule"""
-    return crud.create_rule(db, rule)
+    return await async_crud.create_rule(db, rule)
+
+# Backtests load and crunch whole reading ranges, so they stay sync and run in the threadpool
+@router.post("/rules/backtest", response_model=schemas.BacktestResult)
+def backtest_adhoc_rule(request: schemas.BacktestRequest, db: Session = Depends(get_db)):
+    """Replay recorded readings through a rule that is not saved yet"""
+    start, end = backtest.to_naive_utc(request.start), backtest.to_naive_utc(request.end)
+    if end <= start:
+        raise HTTPException(status_code=400, detail="end must be after start")
+    if backtest.evaluation_count(request.rule, start, end) > backtest.MAX_EVALUATIONS:
+        raise HTTPException(status_code=400, detail=f"Backtest is limited to {backtest.MAX_EVALUATIONS} checks")
+    return NegotiatedResponse(backtest.backtest_rule(db, request.rule, start, end))
 
 @router.get("/rules", response_model=List[schemas.Rule])
-def read_rules(
+async def read_rules(
     skip: int = 0, 
     limit: int = 100, 
     device_type: Optional[str] = None,
     is_active: Optional[bool] = None,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get all rules with optional filtering"""
-    query = db.query(models.Rule)
+    query = select(models.Rule)
     
     if device_type:
         query = query.filter(models.Rule.device_type == device_type)
@@ -29,42 +43,60 @@ def read_rules(
     if is_active is not None:
         query = query.filter(models.Rule.is_active == is_active)
         
-    return query.offset(skip).limit(limit).all()
+    result = await db.execute(query.offset(skip).limit(limit))
+    return NegotiatedResponse([orm_to_dict(rule, schemas.Rule) for rule in result.scalars().all()])
 
 @router.get("/rules/{rule_id}", response_model=schemas.Rule)
-def read_rule(rule_id: int = Path(...), db: Session = Depends(get_db)):
+async def read_rule(rule_id: int = Path(...), db: AsyncSession = Depends(get_async_db)):
     """Get a specific rule by ID"""
-    rule = crud.get_rule(db, rule_id)
+    rule = await async_crud.get_rule(db, rule_id)
     if rule is None:
         raise HTTPException(status_code=404, detail="Rule not found")
-    return rule
+    return NegotiatedResponse(orm_to_dict(rule, schemas.Rule))
 
 @router.put("/rules/{rule_id}", response_model=schemas.Rule)
-def update_rule(
+async def update_rule(
     rule_update: schemas.RuleUpdate, 
     rule_id: int = Path(...), 
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Update a rule"""
-    rule = crud.update_rule(db, rule_id, rule_update)
+    rule = await async_crud.update_rule(db, rule_id, rule_update)
     if rule is None:
         raise HTTPException(status_code=404, detail="Rule not found")
     return rule
 
 @router.delete("/rules/{rule_id}")
-def delete_rule(rule_id: int = Path(...), db: Session = Depends(get_db)):
+async def delete_rule(rule_id: int = Path(...), db: AsyncSession = Depends(get_async_db)):
     """Delete a rule"""
-    success = crud.delete_rule(db, rule_id)
+    success = await async_crud.delete_rule(db, rule_id)
     if not success:
         raise HTTPException(status_code=404, detail="Rule not found")
     return {"message": "Rule deleted successfully"}
 
 @router.post("/rules/{rule_id}/toggle", response_model=schemas.Rule)
-def toggle_rule_status(rule_id: int = Path(...), db: Session = Depends(get_db)):
+async def toggle_rule_status(rule_id: int = Path(...), db: AsyncSession = Depends(get_async_db)):
     """Toggle rule active status"""
-    rule = crud.get_rule(db, rule_id)
+    rule = await async_crud.get_rule(db, rule_id)
     if rule is None:
         raise HTTPException(status_code=404, detail="Rule not found")
     
     rule_update = schemas.RuleUpdate(is_active=not rule.is_active)
-    return crud.update_rule(db, rule_id, rule_update)
+    return await async_crud.update_rule(db, rule_id, rule_update)
+
+@router.post("/rules/{rule_id}/backtest", response_model=schemas.BacktestResult)
+def backtest_rule(
+    time_range: schemas.BacktestRange,
+    rule_id: int = Path(...),
+    db: Session = Depends(get_db)
+):
+    """Replay recorded readings through an existing rule"""
+    rule = crud.get_rule(db, rule_id)
+    if rule is None:
+        raise HTTPException(status_code=404, detail="Rule not found")
+    start, end = backtest.to_naive_utc(time_range.start), backtest.to_naive_utc(time_range.end)
+    if end <= start:
+        raise HTTPException(status_code=400, detail="end must be after start")
+    if backtest.evaluation_count(rule, start, end) > backtest.MAX_EVALUATIONS:
+        raise HTTPException(status_code=400, detail=f"Backtest is limited to {backtest.MAX_EVALUATIONS} checks")
+    return NegotiatedResponse(backtest.backtest_rule(db, rule, start, end))
\ No newline at end of file
@@ -1,79 +1,104 @@
 from fastapi import APIRouter, Depends, HTTPException, Query, BackgroundTasks
-from sqlalchemy.orm import Session
-from typing import Optional
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional
+from datetime import datetime
 import time
 import asyncio
 
-from ..database import get_db, SessionLocal
+from ..database import get_async_db, SessionLocal
 from ..models import SensorData
-from .. import schemas, crud
+from .. import schemas, crud, async_crud, backtest
+from ..serialization import NegotiatedResponse, NegotiatedRoute, orm_to_dict
 
-router = APIRouter()
+router = APIRouter(route_class=NegotiatedRoute, default_response_class=NegotiatedResponse)
 
 @router.get("/temperature", response_model=float)
-def get_temperature(db: Session = Depends(get_db)):
+async def get_temperature(db: AsyncSession = Depends(get_async_db)):
     """Get current temperature"""
-    sensor_data = crud.get_or_create_sensor_data(db)
-    return sensor_data.temperature
+    sensor_data = await async_crud.get_or_create_sensor_data(db)
+    return NegotiatedResponse(sensor_data.temperature)
 
 @router.post("/temperature", response_model=float)
-def set_temperature(temperature: float, db: Session = Depends(get_db)):
+async def set_temperature(temperature: float, db: AsyncSession = Depends(get_async_db)):
     """Set temperature value"""
-    sensor_data = crud.update_sensor_data(db, schemas.SensorDataCreate(temperature=temperature))
-    return sensor_data.temperature
+    sensor_data = await async_crud.update_sensor_data(db, schemas.SensorDataCreate(temperature=temperature))
+    return NegotiatedResponse(sensor_data.temperature)
 
 @router.get("/humidity", response_model=float)
-def get_humidity(db: Session = Depends(get_db)):
+async def get_humidity(db: AsyncSession = Depends(get_async_db)):
     """Get current humidity"""
-    sensor_data = crud.get_or_create_sensor_data(db)
-    return sensor_data.humidity
+    sensor_data = await async_crud.get_or_create_sensor_data(db)
+    return NegotiatedResponse(sensor_data.humidity)
 
 @router.post("/humidity", response_model=float)
-def set_humidity(humidity: float, db: Session = Depends(get_db)):
+async def set_humidity(humidity: float, db: AsyncSession = Depends(get_async_db)):
     """Set humidity value"""
-    sensor_data = crud.update_sensor_data(db, schemas.SensorDataCreate(humidity=humidity))
-    return sensor_data.humidity
+    sensor_data = await async_crud.update_sensor_data(db, schemas.SensorDataCreate(humidity=humidity))
+    return NegotiatedResponse(sensor_data.humidity)
 
 @router.get("/luminosity", response_model=float)
-def get_luminosity(db: Session = Depends(get_db)):
+async def get_luminosity(db: AsyncSession = Depends(get_async_db)):
     """Get current luminosity"""
-    sensor_data = crud.get_or_create_sensor_data(db)
-    return sensor_data.luminosity
+    sensor_data = await async_crud.get_or_create_sensor_data(db)
+    return NegotiatedResponse(sensor_data.luminosity)
 
 @router.post("/luminosity", response_model=float)
-def set_luminosity(luminosity: float, db: Session = Depends(get_db)):
+async def set_luminosity(luminosity: float, db: AsyncSession = Depends(get_async_db)):
     """Set luminosity value"""
-    sensor_data = crud.update_sensor_data(db, schemas.SensorDataCreate(luminosity=luminosity))
-    return sensor_data.luminosity
+    sensor_data = await async_crud.update_sensor_data(db, schemas.SensorDataCreate(luminosity=luminosity))
+    return NegotiatedResponse(sensor_data.luminosity)
 
 @router.get("/lights", response_model=bool)
-def get_lights_status(db: Session = Depends(get_db)):
+async def get_lights_status(db: AsyncSession = Depends(get_async_db)):
     """Get lights status"""
-    sensor_data = crud.get_or_create_sensor_data(db)
-    return sensor_data.lights_status
+    sensor_data = await async_crud.get_or_create_sensor_data(db)
+    return NegotiatedResponse(sensor_data.lights_status)
 
 @router.post("/lights", response_model=bool)
-def set_lights_status(status: bool, db: Session = Depends(get_db)):
+async def set_lights_status(status: bool, db: AsyncSession = Depends(get_async_db)):
     """Set lights status"""
-    sensor_data = crud.update_sensor_data(db, schemas.SensorDataCreate(lights_status=status))
-    return sensor_data.lights_status
+    sensor_data = await async_crud.update_sensor_data(db, schemas.SensorDataCreate(lights_status=status))
+    return NegotiatedResponse(sensor_data.lights_status)
 
 @router.get("/water-pump", response_model=bool)
-def get_water_pump_status(db: Session = Depends(get_db)):
+async def get_water_pump_status(db: AsyncSession = Depends(get_async_db)):
     """Get water pump status"""
-    sensor_data = crud.get_or_create_sensor_data(db)
-    return sensor_data.water_pump_status
+    sensor_data = await async_crud.get_or_create_sensor_data(db)
+    return NegotiatedResponse(sensor_data.water_pump_status)
 
 @router.post("/water-pump", response_model=bool)
-def set_water_pump_status(status: bool, db: Session = Depends(get_db)):
+async def set_water_pump_status(status: bool, db: AsyncSession = Depends(get_async_db)):
     """Set water pump status"""
-    sensor_data = crud.update_sensor_data(db, schemas.SensorDataCreate(water_pump_status=status))
-    return sensor_data.water_pump_status
+    sensor_data = await async_crud.update_sensor_data(db, schemas.SensorDataCreate(water_pump_status=status))
+    return NegotiatedResponse(sensor_data.water_pump_status)
+
+@router.get("/readings", response_model=List[schemas.SensorReading])
+async def read_readings(
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    skip: int = 0,
+    limit: int = 100,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Get recorded sensor readings, newest first"""
+    # SQLite stores naive UTC and would silently drop any offset on the bounds
+    start = backtest.to_naive_utc(start) if start else None
+    end = backtest.to_naive_utc(end) if end else None
+    readings = await async_crud.get_sensor_readings(db, start, end, skip, limit)
+    return NegotiatedResponse([orm_to_dict(reading, schemas.SensorReading) for reading in readings])
+
+@router.post("/readings", response_model=schemas.SensorReading)
+async def create_reading(reading: schemas.SensorReadingCreate, db: AsyncSession = Depends(get_async_db)):
+    """Record several sensor values at once"""
+    if not reading.dict(exclude_none=True):
+        raise HTTPException(status_code=400, detail="At least one of temperature, humidity or luminosity is required")
+    db_reading = await async_crud.create_sensor_reading(db, reading)
+    return NegotiatedResponse(orm_to_dict(db_reading, schemas.SensorReading))
 
 @router.post("/lights/timed")
-def control_lights_with_timer(
+async def control_lights_with_timer(
     duration_minutes: int = Query(..., description="Duration in minutes to keep the lights on"),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Turn on lights with timer
@@ -87,16 +112,16 @@ def control_lights_with_timer(
         finally:
             db.close()
    
-    crud.control_lights_with_timer(db, duration_minutes, get_db_session)
+    await async_crud.control_lights_with_timer(db, duration_minutes, get_db_session)
    
     return {
         "message": f"Lights turned on and will automatically turn off after {duration_minutes} minutes"
     }
 
 @router.post("/water_pump/timed")
-def control_water_pump_with_timer(
+async def control_water_pump_with_timer(
     duration_minutes: int = Query(..., description="Duration in minutes to keep the water pump on"),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Turn on water pump with timer
@@ -110,15 +135,22 @@ def control_water_pump_with_timer(
         finally:
             db.close()
 
-    crud.control_water_pump_with_timer(db, duration_minutes, get_db_session)
+    await async_crud.control_water_pump_with_timer(db, duration_minutes, get_db_session)
    
     return {
         "message": f"Water pump turned on and will automatically turn off after {duration_minutes} minutes"
     }
 
 @router.get("/timers/status")
-def get_timer_status():
+async def get_timer_status():
     """
     Control timers
     """
-    return crud.get_timer_status()
\ No newline at end of file
+    return crud.get_timer_status()
+
+@router.get("/workers/status")
+async def get_worker_status():
+    """
+    Worker pool metrics
+    """
+    return crud.get_worker_status()
\ No newline at end of file
@@ -4,6 +4,7 @@ import time
 from datetime import datetime, timedelta
 from typing import List, Callable, Dict
 from sqlalchemy.orm import Session
+from .worker_pool import DeviceWorkerPool
 
 class RuleChecker:
     _instance = None
@@ -69,17 +70,41 @@ class RuleChecker:
                     if conditions_met:
                         print(f"[{current_time}] Rule '{rule.name}' conditions met, triggering action for {rule.device_type}")
                         
-                        if rule.device_type == "water_pump":
-                            crud.control_water_pump_with_timer(db, rule.duration_minutes, self.db_factory)
-                        elif rule.device_type == "lights":
-                            crud.control_lights_with_timer(db, rule.duration_minutes, self.db_factory)
+                        submitted = DeviceWorkerPool().submit(
+                            rule.device_type,
+                            self._create_action(rule.id, rule.device_type, rule.duration_minutes, current_time)
+                        )
                         
-                        rule.last_triggered = current_time
-                        db.commit()
+                        # The pool dropped the action, so retry on the next pass instead of a full interval later
+                        if not submitted:
+                            if last_checked is None:
+                                self.rules_last_checked.pop(rule_key, None)
+                            else:
+                                self.rules_last_checked[rule_key] = last_checked
                 
         finally:
             db.close()
 
+    def _create_action(self, rule_id: int, device_type: str, duration_minutes: int, triggered_at: datetime):
+        """Build the action for a triggered rule, run on the worker pool with its own session"""
+        def trigger_action():
+            db = self.db_factory()
+            try:
+                from . import crud
+                
+                if device_type == "water_pump":
+                    crud.control_water_pump_with_timer(db, duration_minutes, self.db_factory)
+                elif device_type == "lights":
+                    crud.control_lights_with_timer(db, duration_minutes, self.db_factory)
+                
+                rule = crud.get_rule(db, rule_id)
+                if rule:
+                    rule.last_triggered = triggered_at
+                    db.commit()
+            finally:
+                db.close()
+        return trigger_action
+
     def _evaluate_conditions(self, rule, sensor_data):
         """Evaluate all conditions of a rule against current sensor data"""
         conditions_met = True
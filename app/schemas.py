@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import Optional
+from typing import List, Optional
 from datetime import datetime 
 
 class SensorDataBase(BaseModel):
@@ -18,6 +18,21 @@ class SensorData(SensorDataBase):
     class Config:
         orm_mode = True 
 
+class SensorReadingCreate(BaseModel):
+    temperature: Optional[float] = None
+    humidity: Optional[float] = None
+    luminosity: Optional[float] = None
+
+class SensorReading(BaseModel):
+    id: int
+    recorded_at: datetime
+    temperature: float
+    humidity: float
+    luminosity: float
+
+    class Config:
+        orm_mode = True
+
 class RuleBase(BaseModel):
     name: str
     device_type: str
@@ -53,3 +68,17 @@ class Rule(RuleBase):
 
     class Config:
         orm_mode = True
+
+
+class BacktestRange(BaseModel):
+    start: datetime
+    end: datetime
+
+class BacktestRequest(BacktestRange):
+    rule: RuleCreate
+
+class BacktestResult(BaseModel):
+    evaluations: int
+    trigger_count: int
+    trigger_times: List[datetime]
+    device_on_minutes: float
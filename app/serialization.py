@@ -0,0 +1,124 @@
+# serialization.py
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Any, Callable, List, Tuple, Type
+import msgpack
+import orjson
+from fastapi import Request, Response
+from fastapi.responses import JSONResponse
+from fastapi.routing import APIRoute
+from pydantic import BaseModel
+
+MSGPACK_MEDIA_TYPES = ("application/msgpack", "application/x-msgpack")
+
+_wants_msgpack: ContextVar[bool] = ContextVar("wants_msgpack", default=False)
+
+
+def _msgpack_default(value: Any):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Cannot serialize {type(value).__name__} to MessagePack")
+
+
+def _is_msgpack(content_type: str) -> bool:
+    return content_type.split(";")[0].strip().lower() in MSGPACK_MEDIA_TYPES
+
+
+def _parse_accept(accept: str) -> List[Tuple[str, float]]:
+    """Split an Accept header into (media range, q-value) pairs"""
+    media_ranges = []
+    for part in accept.split(","):
+        media_range, *params = [item.strip() for item in part.split(";")]
+        if not media_range:
+            continue
+        q = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        media_ranges.append((media_range.lower(), q))
+    return media_ranges
+
+
+def _quality(media_ranges: List[Tuple[str, float]], media_type: str) -> float:
+    """q-value of the most specific media range matching media_type"""
+    main_type = media_type.split("/")[0]
+    best_specificity, best_q = -1, 0.0
+    for media_range, q in media_ranges:
+        if media_range == media_type:
+            specificity = 2
+        elif media_range == f"{main_type}/*":
+            specificity = 1
+        elif media_range == "*/*":
+            specificity = 0
+        else:
+            continue
+        if specificity > best_specificity:
+            best_specificity, best_q = specificity, q
+    return best_q
+
+
+def _prefers_msgpack(accept: str) -> bool:
+    """MessagePack only when the client ranks it above JSON, which stays the default"""
+    if not accept:
+        return False
+    media_ranges = _parse_accept(accept)
+    msgpack_q = max(_quality(media_ranges, media_type) for media_type in MSGPACK_MEDIA_TYPES)
+    return msgpack_q > 0 and msgpack_q > _quality(media_ranges, "application/json")
+
+
+def orm_to_dict(obj, schema: Type[BaseModel]) -> dict:
+    """Read the schema fields straight off an ORM object, skipping pydantic validation"""
+    return {name: getattr(obj, name) for name in schema.__fields__}
+
+
+class NegotiatedResponse(JSONResponse):
+    """
+    orjson-encoded JSON, or MessagePack when the client asked for it
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.headers.add_vary_header("Accept")
+
+    def render(self, content: Any) -> bytes:
+        if _wants_msgpack.get():
+            self.media_type = MSGPACK_MEDIA_TYPES[0]
+            return msgpack.packb(content, default=_msgpack_default)
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+
+
+class MsgPackRequest(Request):
+    """
+    Request with a MessagePack body that FastAPI reads as if it were JSON
+    """
+    def __init__(self, request: Request):
+        scope = dict(request.scope)
+        scope["headers"] = [
+            (key, b"application/json") if key == b"content-type" else (key, value)
+            for key, value in request.scope["headers"]
+        ]
+        super().__init__(scope, request.receive)
+
+    async def json(self) -> Any:
+        if not hasattr(self, "_json"):
+            self._json = msgpack.unpackb(await self.body())
+        return self._json
+
+
+class NegotiatedRoute(APIRoute):
+    """
+    Route that accepts and returns MessagePack alongside JSON
+    """
+    def get_route_handler(self) -> Callable:
+        original_route_handler = super().get_route_handler()
+
+        async def negotiated_route_handler(request: Request) -> Response:
+            _wants_msgpack.set(_prefers_msgpack(request.headers.get("accept", "")))
+            if _is_msgpack(request.headers.get("content-type", "")):
+                request = MsgPackRequest(request)
+            return await original_route_handler(request)
+
+        return negotiated_route_handler
@@ -3,12 +3,14 @@ import threading
 import time
 from sqlalchemy.sql import func
 from typing import Dict, Callable, Any, Optional
+from .worker_pool import DeviceWorkerPool
 
 class DeviceTimer:
-    def __init__(self, device_name: str, duration_minutes: int, callback: Callable):
+    def __init__(self, device_name: str, duration_minutes: int, callback: Callable, target_state: Optional[str] = None):
         self.device_name = device_name
         self.end_time = datetime.now() + timedelta(minutes=duration_minutes)
         self.callback = callback
+        self.target_state = target_state
         self.cancelled = False
 
     def is_expired(self) -> bool:
@@ -37,10 +39,14 @@ class TimerService:
                 cls._instance.thread = None
             return cls._instance
 
-    def start_timer(self, device_name: str, duration_minutes: int, callback: Callable[[], Any]) -> str:
-        """Start a timer for the specified device"""
+    def start_timer(self, device_name: str, duration_minutes: int, callback: Callable[[], Any], target_state: Optional[str] = None) -> str:
+        """
+        Start a timer for the specified device
+
+        Expired callbacks with the same target_state for a device are coalesced
+        """
         timer_id = f"{device_name}_{datetime.now().timestamp()}"
-        self.timers[timer_id] = DeviceTimer(device_name, duration_minutes, callback)
+        self.timers[timer_id] = DeviceTimer(device_name, duration_minutes, callback, target_state)
         
        
         if not self.is_running:
@@ -65,13 +71,11 @@ class TimerService:
         return None
 
     def _check_timers(self):
-        """Check all timers and execute callbacks for expired ones"""
+        """Check all timers and dispatch callbacks for expired ones to the worker pool"""
+        worker_pool = DeviceWorkerPool()
         for timer_id, timer in list(self.timers.items()):
-            if timer.is_expired():
-                try:
-                    timer.callback()
-                except Exception as e:
-                    print(f"Error executing timer callback: {e}")
+            # A full pool must not drop the callback, so keep the timer and retry on the next tick
+            if timer.is_expired() and worker_pool.submit(timer.device_name, timer.callback, timer.target_state, block=False):
                 self.timers.pop(timer_id, None)
 
     def _timer_loop(self):
@@ -0,0 +1,142 @@
+# worker_pool.py
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Deque, Dict, Optional
+
+MAX_WORKERS = 4
+MAX_PENDING = 100
+SUBMIT_TIMEOUT_SECONDS = 5
+
+
+class DeviceJob:
+    def __init__(self, callback: Callable[[], Any], target_state: Optional[str]):
+        self.callback = callback
+        self.target_state = target_state
+        self.submitted_at = time.monotonic()
+
+
+class DeviceWorkerPool:
+    """
+    Bounded thread pool that runs jobs for the same device one at a time, in order
+    """
+    _instance = None
+    _lock = threading.Lock()
+
+    def __new__(cls):
+        with cls._lock:
+            if cls._instance is None:
+                cls._instance = super(DeviceWorkerPool, cls).__new__(cls)
+                cls._instance.executor = None
+                cls._instance.queues = {}
+                cls._instance.running_devices = set()
+                cls._instance.queue_lock = threading.Lock()
+                cls._instance.slots = threading.BoundedSemaphore(MAX_PENDING)
+                cls._instance.metrics = {
+                    "submitted": 0,
+                    "completed": 0,
+                    "failed": 0,
+                    "coalesced": 0,
+                    "deferred": 0,
+                    "rejected": 0,
+                    "max_wait_seconds": 0.0
+                }
+            return cls._instance
+
+    def submit(self, device_name: str, callback: Callable[[], Any], target_state: Optional[str] = None,
+               block: bool = True) -> bool:
+        """
+        Queue a job for the device
+
+        A job whose target_state matches the last job still queued for the device
+        is coalesced into it, since running both would leave the device in the same state.
+        While MAX_PENDING jobs are waiting, a blocking submit waits up to
+        SUBMIT_TIMEOUT_SECONDS and then drops the job, and a non-blocking submit
+        returns at once so the caller can retry. Returns False only when the job
+        was not taken.
+        """
+        with self.queue_lock:
+            if self._coalesce(device_name, target_state):
+                return True
+
+        if not block:
+            if not self.slots.acquire(blocking=False):
+                with self.queue_lock:
+                    self.metrics["deferred"] += 1
+                return False
+        elif not self.slots.acquire(timeout=SUBMIT_TIMEOUT_SECONDS):
+            with self.queue_lock:
+                self.metrics["rejected"] += 1
+            print(f"Worker pool is full, dropping job for {device_name}")
+            return False
+
+        with self.queue_lock:
+            # Another job may have been queued while waiting for a slot
+            if self._coalesce(device_name, target_state):
+                self.slots.release()
+                return True
+
+            self.queues.setdefault(device_name, deque()).append(DeviceJob(callback, target_state))
+            self.metrics["submitted"] += 1
+
+            if device_name not in self.running_devices:
+                self.running_devices.add(device_name)
+                self._get_executor().submit(self._drain, device_name)
+        return True
+
+    def _coalesce(self, device_name: str, target_state: Optional[str]) -> bool:
+        """Must be called with queue_lock held"""
+        queue = self.queues.get(device_name)
+        if target_state is not None and queue and queue[-1].target_state == target_state:
+            self.metrics["coalesced"] += 1
+            return True
+        return False
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self.executor is None:
+            self.executor = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix="device-worker")
+        return self.executor
+
+    def _drain(self, device_name: str):
+        """Run the device's jobs in order until its queue is empty"""
+        while True:
+            with self.queue_lock:
+                queue: Deque[DeviceJob] = self.queues.get(device_name)
+                if not queue:
+                    self.queues.pop(device_name, None)
+                    self.running_devices.discard(device_name)
+                    return
+                job = queue.popleft()
+                wait = time.monotonic() - job.submitted_at
+                self.metrics["max_wait_seconds"] = max(self.metrics["max_wait_seconds"], wait)
+
+            try:
+                job.callback()
+                succeeded = True
+            except Exception as e:
+                print(f"Error executing job for {device_name}: {e}")
+                succeeded = False
+            finally:
+                self.slots.release()
+
+            with self.queue_lock:
+                self.metrics["completed" if succeeded else "failed"] += 1
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """Get counters and current queue depth"""
+        with self.queue_lock:
+            return {
+                **self.metrics,
+                "pending": sum(len(queue) for queue in self.queues.values()),
+                "busy_devices": len(self.running_devices),
+                "max_workers": MAX_WORKERS,
+                "max_pending": MAX_PENDING
+            }
+
+    def stop(self):
+        """Wait for queued jobs to finish and stop the workers"""
+        executor, self.executor = self.executor, None
+        if executor:
+            executor.shutdown(wait=True)
+            print("Worker pool stopped")
@@ -0,0 +1,75 @@
+"""
+CPU cost of serializing rule and reading responses
+
+Run from the repository root with: python -m benchmarks.serialization
+"""
+import json
+import time
+from datetime import datetime, timedelta
+
+from fastapi.encoders import jsonable_encoder
+
+from app import database, models, schemas
+from app.serialization import _wants_msgpack, NegotiatedResponse, orm_to_dict
+
+ITERATIONS = 2000
+ITEMS = 100
+
+
+def make_rules():
+    now = datetime.now()
+    return [
+        models.Rule(
+            id=i, name=f"rule {i}", device_type="lights",
+            temperature_condition=">", temperature_value=25.0,
+            humidity_condition="<", humidity_value=40.0,
+            duration_minutes=10, check_interval_minutes=30,
+            is_active=True, created_at=now, last_triggered=now
+        )
+        for i in range(ITEMS)
+    ]
+
+
+def make_readings():
+    now = datetime.now()
+    return [
+        models.SensorReading(
+            id=i, recorded_at=now - timedelta(minutes=i),
+            temperature=20.0 + i / 10, humidity=50.0, luminosity=300.0
+        )
+        for i in range(ITEMS)
+    ]
+
+
+def pydantic_json(rows, schema):
+    """What FastAPI does for a response_model with the stdlib encoder"""
+    validated = [schema.from_orm(row) for row in rows]
+    return json.dumps(jsonable_encoder(validated)).encode("utf-8")
+
+
+def negotiated(rows, schema, msgpack=False):
+    _wants_msgpack.set(msgpack)
+    return NegotiatedResponse([orm_to_dict(row, schema) for row in rows]).body
+
+
+def measure(label, func, *args, **kwargs):
+    start = time.process_time()
+    for _ in range(ITERATIONS):
+        body = func(*args, **kwargs)
+    elapsed = time.process_time() - start
+    print(f"{label:<32} {elapsed / ITERATIONS * 1e6:>9.1f} us/request {len(body):>7} bytes")
+
+
+def main():
+    for name, rows, schema in (
+        ("rules", make_rules(), schemas.Rule),
+        ("readings", make_readings(), schemas.SensorReading),
+    ):
+        print(f"{ITEMS} {name}")
+        measure("  pydantic + json", pydantic_json, rows, schema)
+        measure("  orjson", negotiated, rows, schema)
+        measure("  msgpack", negotiated, rows, schema, msgpack=True)
+
+
+if __name__ == "__main__":
+    main()